@@ -31,9 +31,9 @@ locals().update(configs['measurement_configs'][list_of_keys[picked_config]])
 auths_file = '/etc/rabbitmq-secret/authentications.json'
 the_interface = Interface(dripline_config={'auth-file': auths_file})
 
-#set up motors and data_logger
-orpheus_motors = OrpheusMotors(auths_file, motors_to_move)
-data_logger = DataLogger(auths_file)
+#set up motors and data_logger, sharing the one dripline connection
+orpheus_motors = OrpheusMotors(auths_file, motors_to_move, interface = the_interface)
+data_logger = DataLogger(auths_file, interface = the_interface)
 
 #make sure we start off with good settings, no matter what the current state is
 data_logger.initialize_na_settings_for_modemap(averages = averages, average_enable = average_enable, power = vna_power, sweep_points = sweep_points)
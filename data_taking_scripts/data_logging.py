@@ -4,27 +4,48 @@ Collection of utility functions used while data taking.
 
 from dripline.core import Interface
 import time
-import math
 import numpy as np
-from fitting_functions import data_lorentzian_fit
-from fitting_functions import calculate_coupling
-from fitting_functions import reflection_deconvolve_line
-from fitting_functions import deconvolve_phase
-from scipy.interpolate import interp1d
-from fitting_functions import func_pow_reflected
+# fitting_functions pulls in scipy, which is slow to import. Scripts that never
+# fit (e.g. digitization_test.py) should not pay that at startup, so the fitting
+# branches below import it lazily.
 import logging
 logging.basicConfig(level=logging.INFO)
 dl_logger = logging.getLogger(__name__)
 
+_SPEED_OF_LIGHT = 299792458.0
+
 class DataLogger:
 
-    def __init__(self, auths_file):
+    def __init__(self, auths_file, interface = None):
         self.auths_file = auths_file
-        self.cmd_interface = Interface(dripline_config={'auth-file': self.auths_file})
+        # share an existing Interface when given one, to avoid an extra AMQP handshake
+        if interface is None:
+            interface = Interface(dripline_config={'auth-file': self.auths_file})
+        self.cmd_interface = interface
         self.list_of_na_entities = ['na_start_freq', 'na_stop_freq',
                                      'na_power', 'na_averages','na_average_enable']
         self.list_of_motor_entities = ['curved_mirror_steps', 'bottom_dielectric_plate_steps',
                                        'top_dielectric_plate_steps']
+        # no service in this tree implements the fused get_and_log command yet,
+        # so the two-call path is the default; flip this once the logging
+        # services advertise the command
+        self._get_and_log_supported = False
+
+    def _get_and_log(self, endpoint, sleep_time = 0, get_first = True):
+        ''' Logs an endpoint. When _get_and_log_supported is enabled this is one
+            server-side get_and_log command, halving the round trips of the get
+            then scheduled_log pair; errors from the fused command propagate
+            rather than being guessed at.
+            get_first says whether the two-call path issues a get before
+            scheduled_log, matching what the call site originally did. '''
+        if self._get_and_log_supported:
+            time.sleep(sleep_time)
+            self.cmd_interface.cmd(endpoint, 'get_and_log')
+            return
+        if get_first:
+            self.cmd_interface.get(endpoint)
+        time.sleep(sleep_time)
+        self.cmd_interface.cmd(endpoint, 'scheduled_log')
 
     def set_start_freq(self,start_freq):
         self.cmd_interface.set('na_start_freq', start_freq)
@@ -82,8 +103,8 @@ class DataLogger:
         time.sleep(sec_wait_for_na_averaging)
         if autoscale:
             self.cmd_interface.set('na_commands', 'autoscale')
-        self.cmd_interface.cmd('na_s21_iq_data', 'scheduled_log')
-        self.cmd_interface.cmd('na_s11_iq_data_trace2', 'scheduled_log')
+        self._get_and_log('na_s21_iq_data', get_first = False)
+        self._get_and_log('na_s11_iq_data_trace2', get_first = False)
         dl_logger.info('Setting na_measurement_status to stop_measurement')
         self.cmd_interface.set('na_measurement_status', 'stop_measurement')
 
@@ -107,6 +128,7 @@ class DataLogger:
         if track_max_transmission:
             self.cmd_interface.set('transmission_max', np.max(s21_pow))
         if fitting:
+            from fitting_functions import data_lorentzian_fit
             try:
                 dl_logger.warning('Could not perform a proper fit')
                 popt_transmission, pcov_transmission = data_lorentzian_fit(s21_pow, freq, 'transmission')
@@ -150,11 +172,12 @@ class DataLogger:
             s11_re, s11_im = np.array(s11_iq[::2]), np.array(s11_iq[1::2])
             s11_pow = s11_re**2 + s11_im**2
             s11_mag = np.sqrt(s11_pow)
-            s11_phase = np.unwrap(np.angle(s11_re+1j*s11_im))
+            s11_phase = np.unwrap(np.arctan2(s11_im, s11_re))
             freq = np.linspace(start_freq, stop_freq, num = len(s11_pow))
         if track_max_reflection:
             self.cmd_interface.set('reflection_max', np.max(s11_pow))
         if fitting:
+            from fitting_functions import data_lorentzian_fit, deconvolve_phase, calculate_coupling
             try:
                 popt_reflection, pcov_reflection = data_lorentzian_fit(s11_pow, freq, 'reflection')
             except:
@@ -204,9 +227,11 @@ class DataLogger:
             self.cmd_interface.set('na_commands', 'autoscale')
         self.cmd_interface.cmd('s21_iq_transmission_data', 'scheduled_log')
         if fitting:
+            from fitting_functions import data_lorentzian_fit
             s21_iq = self.cmd_interface.get('s21_iq_transmission_data').payload.to_python()['value_cal']
-            s21_re, s21_im = np.array(s21_iq[::2]), np.array(s21_iq[1::2])
-            s21_pow = s21_re**2 + s21_im**2
+            # de-interleave [re,im,re,im,...] as an (N,2) view and get the power in one pass
+            s21_v = np.asarray(s21_iq, dtype = np.float64).reshape(-1, 2)
+            s21_pow = np.einsum('ij,ij->i', s21_v, s21_v)
             freq = np.linspace(start_freq, stop_freq, num = len(s21_pow))
             try:
                 popt_transmission, pcov_transmission = data_lorentzian_fit(s21_pow, freq, 'transmission')
@@ -237,11 +262,16 @@ class DataLogger:
             self.cmd_interface.set('na_commands', 'autoscale')
         self.cmd_interface.cmd('s21_iq_reflection_data', 'scheduled_log')
         if fitting:
+            from fitting_functions import data_lorentzian_fit, calculate_coupling, cubic_interp_at_point, get_arr_ends
             s11_iq = self.cmd_interface.get('s21_iq_reflection_data').payload.to_python()['value_cal']
-            s11_re, s11_im = np.array(s11_iq[::2]), np.array(s11_iq[1::2])
-            s11_pow = s11_re**2 + s11_im**2
+            # de-interleave [re,im,re,im,...] as an (N,2) view and get the power in one pass
+            s11_v = np.asarray(s11_iq, dtype = np.float64).reshape(-1, 2)
+            s11_pow = np.einsum('ij,ij->i', s11_v, s11_v)
             s11_mag = np.sqrt(s11_pow)
-            s11_phase = np.unwrap(np.angle(s11_re+1j*s11_im))
+            # the unwrap must run over the full sweep: unwrapping only short end
+            # segments aliases the delay-line slope modulo 2*pi/span. The O(N)
+            # pass is negligible next to the fit.
+            s11_phase = np.unwrap(np.arctan2(s11_v[:,1], s11_v[:,0]))
             try:
                 popt_reflection, pcov_reflection = data_lorentzian_fit(s11_pow, freq, 'reflection')
                 perr_reflection = np.sqrt(np.diag(pcov_reflection))
@@ -258,9 +288,18 @@ class DataLogger:
                 self.cmd_interface.set('C_reflection', popt_reflection[3])
                 self.cmd_interface.set('sig_C_reflection', perr_reflection[3])
 
-                cavity_phase = deconvolve_phase(freq, s11_phase)
-                cavity_reflection_interp_phase = interp1d(freq, cavity_phase, kind='cubic')
-                phase_at_resonance = cavity_reflection_interp_phase(popt_reflection[0])
+                # the delay line is fitted to the off-resonance sweep ends like
+                # deconvolve_phase does, but it only needs to be subtracted on a
+                # small window around the fitted resonance
+                n_points = len(s11_pow)
+                i0 = int((popt_reflection[0] - start_freq)/(stop_freq - start_freq)*(n_points - 1))
+                window = slice(max(0, i0 - 8), min(n_points, i0 + 8))
+                freq_window = freq[window]
+                f_ends = get_arr_ends(freq, 5)
+                phase_ends = get_arr_ends(s11_phase, 5)
+                delay_line = np.poly1d(np.polyfit(f_ends, phase_ends, 1))
+                cavity_phase = s11_phase[window] - delay_line(freq_window)
+                phase_at_resonance = cubic_interp_at_point(freq_window, cavity_phase, popt_reflection[0])
 
                 if popt_reflection[2] >= popt_reflection[3]:
                     antenna_coupling = 1
@@ -383,28 +422,23 @@ class DataLogger:
         self.cmd_interface.set('axion_data_taking_status', 'stop_measurement')
 
     def log_s21(self, sleep_time = 0):
-        self.cmd_interface.get('na_s21_iq_data')
-        time.sleep(sleep_time)
-        self.cmd_interface.cmd('na_s21_iq_data', 'scheduled_log')
+        self._get_and_log('na_s21_iq_data', sleep_time)
 
     def log_s11(self, sleep_time = 0):
-        self.cmd_interface.get('na_s11_iq_data')
-        time.sleep(sleep_time)
-        self.cmd_interface.cmd('na_s11_iq_data', 'scheduled_log')
+        self._get_and_log('na_s11_iq_data', sleep_time)
 
     def flmn(self,l, m, n, length,eps_r = 1, r0 = 33):
         ''' Calculates the resonant frequency for TEM 00n mode in an empty Fabry-Perot cavity..
-            Input units should be in cm. '''
-        c = 299792458.0
-        pi = math.pi
-        v = c/math.sqrt(eps_r)
-        sum = 1+l+m
-        l_in_m = length/100
+            Input units should be in cm.
+            Length may be a scalar or an array; an array of lengths is computed
+            in one vectorized pass, e.g. when plotting mode maps. '''
+        v = _SPEED_OF_LIGHT/np.sqrt(eps_r)
+        l_in_m = np.multiply(length, 0.01)
         r0_m = r0/100
 
-        arccos_term = math.acos(1-2*l_in_m/r0_m)
-        n_term = ((n+1)*v/2)/l_in_m
-        lm_term = sum*v/(4*l_in_m*pi)
+        arccos_term = np.arccos(1 - 2*l_in_m/r0_m)
+        n_term = (n+1)*v*0.5/l_in_m
+        lm_term = (1+l+m)*v/(4*np.pi*l_in_m)
         resonant_frequency = n_term + lm_term*arccos_term
         return resonant_frequency
 
@@ -1,9 +1,22 @@
 import numpy as np
 from scipy import stats
 from scipy.optimize import curve_fit
+from scipy.optimize import least_squares
 from scipy.constants import constants
 from scipy.interpolate import interp1d
 
+# numba is optional. The lorentzian model and its jacobian below compile with numba
+# when it is available, removing the python-callback overhead in the fits.
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        def decorator(func):
+            return func
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return decorator
+
 def unpack_iq_data(data):
     ''' Input - [re,im,re,im,...]
         Output - [sqrt(re^2+im^2),sqrt(re^2+im^2),...]
@@ -11,6 +24,24 @@ def unpack_iq_data(data):
     unpacked_data = [data[i]**2+ data[i+1]**2 for i in range(0,len(data)-1,2)]
     return np.array(unpacked_data)
 
+def iq_downmix_power_spectrum(data, sampling_rate, if_center):
+    ''' Input - interleaved digitizer samples [re,im,re,im,...], the sampling
+        rate in Hz and the IF center frequency in Hz.
+        Output - power spectrum of the signal mixed down to baseband.
+        For offline analysis of saved digitizer runs; nothing in the data
+        taking path calls this. Reinterprets the interleaved buffer as
+        complex, downmixes against a complex exponential (which allocates the
+        time grid and the mixer tone) and takes one FFT with scipy's
+        multithreaded pocketfft backend. '''
+    import scipy.fft
+    v = np.asarray(data, dtype = np.float64).reshape(-1, 2)
+    iq = v.view(np.complex128)[:,0].copy()
+    t = np.arange(iq.size)/sampling_rate
+    iq *= np.exp(-2j*np.pi*if_center*t)
+    spectrum = scipy.fft.fft(iq, workers = -1)
+    # power straight from the components, avoiding the np.abs temporary
+    return spectrum.real**2 + spectrum.imag**2
+
 def estimate_uncertainty(data):
     return 2*np.sqrt(data)
 
@@ -83,28 +114,106 @@ def guess_parameters(data, freq, measurement_type):
     q = q_guess(data, freq, measurement_type)
     return f0,q, dy, offset
 
+@njit(cache=True, fastmath=True)
 def func_pow_transmitted(f, fo, Q, del_y, C):
     return (fo/(2*Q))**2*del_y/((f-fo)**2+(fo/(2*Q))**2)+C
 
+@njit(cache=True, fastmath=True)
 def func_pow_reflected(f, fo, Q, del_y, C):
     return -(fo/(2*Q))**2*del_y/((f-fo)**2+(fo/(2*Q))**2)+C
 
+@njit(cache=True, fastmath=True)
+def jac_pow_transmitted(f, fo, Q, del_y, C):
+    ''' Analytic jacobian of func_pow_transmitted with respect to (fo, Q, del_y, C).
+        Returns an (N,4) array. Passing this to the fitter avoids the
+        finite-difference model evaluations. '''
+    hw2 = (fo/(2*Q))**2
+    d = f - fo
+    D = d**2 + hw2
+    jac = np.empty((f.size, 4))
+    jac[:,0] = del_y*((fo/(2*Q**2))*d**2 + 2*d*hw2)/D**2
+    jac[:,1] = -2*del_y*hw2*d**2/(Q*D**2)
+    jac[:,2] = hw2/D
+    jac[:,3] = 1.0
+    return jac
+
+@njit(cache=True, fastmath=True)
+def jac_pow_reflected(f, fo, Q, del_y, C):
+    ''' Analytic jacobian of func_pow_reflected with respect to (fo, Q, del_y, C).
+        Returns an (N,4) array. '''
+    jac = jac_pow_transmitted(f, fo, Q, del_y, C)
+    jac[:,0] = -jac[:,0]
+    jac[:,1] = -jac[:,1]
+    jac[:,2] = -jac[:,2]
+    return jac
+
+# evaluate the jitted functions once at import time so the first real fit
+# only sees compiled code
+_f_prewarm = np.linspace(0.9, 1.1, 8)
+func_pow_transmitted(_f_prewarm, 1.0, 100.0, 1.0, 0.0)
+func_pow_reflected(_f_prewarm, 1.0, 100.0, 1.0, 1.0)
+jac_pow_transmitted(_f_prewarm, 1.0, 100.0, 1.0, 0.0)
+jac_pow_reflected(_f_prewarm, 1.0, 100.0, 1.0, 1.0)
+
 def data_lorentzian_fit(data, freq, measurement_type):
-    ''' Uses the scipy curve_fit to perform a lorentzian fit on
+    ''' Uses scipy least_squares to perform a lorentzian fit on
         reflection or transmission data.
-        Resonator_length is a number in cm.
-        Peak_search_width is like span but the calculated/predicted frequency is not always
-        accurate and might have small shifts.
+        The parameters are physically bounded (fo within the sweep, Q and del_y
+        positive), so the bounded trf solver converges without wandering into
+        infeasible regions like the old unbounded LM fit could.
         Guesses parameters based on input parameters.
-        Returns popt which is the calculated parameters given the initial conditions.'''
-    p0_guess = guess_parameters(data, freq, measurement_type)
+        Returns popt and pcov like curve_fit did.'''
+    freq = np.asarray(freq, dtype = np.float64)
+    data = np.asarray(data, dtype = np.float64)
+    p0_guess = np.asarray(guess_parameters(data, freq, measurement_type), dtype = np.float64)
     data_uncertainty = estimate_uncertainty(data)
     if measurement_type == 'transmission':
-        popt, pcov = curve_fit(func_pow_transmitted, freq, data, p0_guess, data_uncertainty)
+        model, model_jac = func_pow_transmitted, jac_pow_transmitted
     else:
-        popt, pcov = curve_fit(func_pow_reflected, freq, data, p0_guess, data_uncertainty)
+        model, model_jac = func_pow_reflected, jac_pow_reflected
+
+    lower = np.array([freq[0], 0.0, 0.0, -np.inf])
+    upper = np.array([freq[-1], np.inf, np.inf, np.inf])
+    p0_guess = np.clip(p0_guess, lower, upper)
+
+    def residuals(p, f, y, sigma):
+        return (model(f, p[0], p[1], p[2], p[3]) - y)/sigma
+
+    def residuals_jac(p, f, y, sigma):
+        return model_jac(f, p[0], p[1], p[2], p[3])/sigma[:, None]
+
+    result = least_squares(residuals, p0_guess, jac = residuals_jac,
+                           bounds = (lower, upper), method = 'trf', x_scale = 'jac',
+                           args = (freq, data, data_uncertainty))
+    # least_squares reports failure in the result instead of raising; keep the
+    # curve_fit contract so callers' except blocks still catch bad fits
+    if not result.success:
+        raise RuntimeError('Lorentzian fit did not converge: {}'.format(result.message))
+    popt = result.x
+    # covariance from the jacobian at the solution, scaled by the reduced
+    # chi-square, same convention as curve_fit with absolute_sigma=False
+    _, s, VT = np.linalg.svd(result.jac, full_matrices = False)
+    s = s[s > np.finfo(np.float64).eps*max(result.jac.shape)*s[0]]
+    VT = VT[:s.size]
+    pcov = np.dot(VT.T/s**2, VT)
+    pcov = pcov*2*result.cost/(freq.size - popt.size)
     return popt, pcov
 
+def cubic_interp_at_point(freq, values, x):
+    ''' Evaluates a cubic (Catmull-Rom) interpolant of values at the single point x.
+        Assumes freq is a uniform grid like the one np.linspace returns.
+        Only touches the 4 samples bracketing x, so it avoids building a
+        full spline table when one evaluation is needed. '''
+    n = len(freq)
+    step = (freq[-1] - freq[0])/(n - 1)
+    # uniform grid, so the bracketing index is a direct computation
+    i = int((x - freq[0])/step)
+    i = min(max(i, 1), n - 3)
+    t = (x - freq[i])/step
+    p0, p1, p2, p3 = values[i-1], values[i], values[i+1], values[i+2]
+    return 0.5*((2*p1) + (-p0 + p2)*t + (2*p0 - 5*p1 + 4*p2 - p3)*t**2
+                + (-p0 + 3*p1 - 3*p2 + p3)*t**3)
+
 def get_arr_ends(x, n_end_elements):
     """returns the first and last n_end_elements of array x"""
     return np.concatenate([x[:n_end_elements], x[-n_end_elements:]])
@@ -11,7 +11,7 @@ auths_file = '/etc/rabbitmq-secret/authentications.json'
 
 the_interface = Interface(dripline_config={'auth-file': auths_file})
 
-data_logger = DataLogger(auths_file)
+data_logger = DataLogger(auths_file, interface = the_interface)
 
 data_logger.switch_digitization_path()
 
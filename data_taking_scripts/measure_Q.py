@@ -5,9 +5,8 @@ from data_logging import DataLogger
 from dripline.core import Interface
 
 auths_file = '/etc/rabbitmq-secret/authentications.json'
-data_logger = DataLogger(auths_file)
-
 the_interface = Interface(dripline_config={'auth-file': auths_file})
+data_logger = DataLogger(auths_file, interface = the_interface)
 
 start_freq = the_interface.get('na_start_freq').payload.to_python()['value_cal']
 stop_freq = the_interface.get('na_stop_freq').payload.to_python()['value_cal']
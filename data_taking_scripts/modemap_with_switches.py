@@ -39,9 +39,9 @@ if narrow_scan:
     predicted_resonances = resonances_and_lengths[:,1]
     func_res_freq_interp = interpolate.interp1d(predicted_lengths, predicted_resonances, kind='cubic')
 
-#set up motors and data logger
-orpheus_motors = OrpheusMotors(auths_file, motors_to_move)
-data_logger = DataLogger(auths_file)
+#set up motors and data logger, sharing the one dripline connection
+orpheus_motors = OrpheusMotors(auths_file, motors_to_move, interface = the_interface)
+data_logger = DataLogger(auths_file, interface = the_interface)
 
 #  Ask user to describe the measurement. Forces user to document what they are doing.
 measurement_description = input('Describe the current measurement setup: ')
@@ -33,9 +33,9 @@ if narrow_scan:
     predicted_resonances = resonances_and_lengths[:,1]
     func_res_freq_interp = interpolate.interp1d(predicted_lengths, predicted_resonances, kind='cubic')
 
-#set up motors and data_logger
+#set up motors and data_logger, sharing the one dripline connection
 orpheus_motors = OrpheusMotors(auths_file, motors_to_move)
-data_logger = DataLogger(auths_file)
+data_logger = DataLogger(auths_file, interface = orpheus_motors.cmd_interface)
 
 #  Ask user to describe the measurement. Forces user to document what they are doing.
 measurement_description = input('Describe the current measurement setup: ')
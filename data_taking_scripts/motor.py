@@ -2,13 +2,17 @@ from dripline.core import Interface
 import time
 class Motor:
     ''' This class creates a motor object using dripline commands.'''
-    def __init__(self,auths_file,name):
+    def __init__(self,auths_file,name, interface = None):
         ''' Initializes a motor object. Connects the motor
             to the dripline interface. Uses functions as described
-            in the yaml files for the motors. '''
+            in the yaml files for the motors.
+            Pass an existing Interface to share one AMQP connection
+            between motors; a new one is opened otherwise. '''
         self.auths_file = auths_file
         self.name = name
-        self.cmd_interface = Interface(dripline_config={'auth-file': self.auths_file})
+        if interface is None:
+            interface = Interface(dripline_config={'auth-file': self.auths_file})
+        self.cmd_interface = interface
 
     def get_name(self):
         ''' Returns the name of the motor. '''
@@ -52,50 +56,59 @@ class CurvedMirrorMotor(Motor):
     ''' Creates a motor object for the curved mirror.
         Inherits the Motor class and thus has access to all
         its methods. '''
-    def __init__(self, auths_file):
-        super().__init__(auths_file, 'curved_mirror')
+    def __init__(self, auths_file, interface = None):
+        super().__init__(auths_file, 'curved_mirror', interface)
 
 class BottomDielectricPlateMotor(Motor):
     ''' Creates a motor object for the bottom_dielectric_plate.
         Inherits the Motor class and thus has access to all
         its methods. '''
-    def __init__(self, auths_file):
-        super().__init__(auths_file, 'bottom_dielectric_plate')
+    def __init__(self, auths_file, interface = None):
+        super().__init__(auths_file, 'bottom_dielectric_plate', interface)
 
 class TopDielectricPlateMotor(Motor):
     ''' Creates a motor object for the top_dielectric_plate.
         Inherits the Motor class and thus has access to all
         its methods. '''
-    def __init__(self, auths_file):
-        super().__init__(auths_file, 'top_dielectric_plate')
+    def __init__(self, auths_file, interface = None):
+        super().__init__(auths_file, 'top_dielectric_plate', interface)
 
 class TestMotor(Motor):
     ''' Creates a motor object for the top_dielectric_plate.
         Inherits the Motor class and thus has access to all
         its methods. '''
-    def __init__(self, auths_file):
-        super().__init__(auths_file, 'resonator_coupling')
+    def __init__(self, auths_file, interface = None):
+        super().__init__(auths_file, 'resonator_coupling', interface)
 
 class OrpheusMotors:
     ''' Creates Motor objects for Orpheus.
         Takes an auth-file and a list of motors as input.'''
-    def __init__(self,auths_file, list_of_motors = []):
+    def __init__(self,auths_file, list_of_motors = [], interface = None,
+                 pitch = (1/20), steps_per_rotation = 20000):
         self.auths_file = auths_file
         self.list_of_motors = set(list_of_motors)
+        # the lead screw geometry is fixed, so precompute steps per inch once
+        self._steps_per_inch = int(round(steps_per_rotation/pitch))
+        # one shared connection for all the motors instead of one handshake each
+        if interface is None:
+            interface = Interface(dripline_config={'auth-file': self.auths_file})
+        self.cmd_interface = interface
         self.motors = []
         for motor in self.list_of_motors:
             if motor == 'curved_mirror':
-                self.curved_mirror = CurvedMirrorMotor(self.auths_file)
+                self.curved_mirror = CurvedMirrorMotor(self.auths_file, self.cmd_interface)
                 self.motors.append(self.curved_mirror)
             elif motor == 'bottom_dielectric_plate':
-                self.bottom_plate = BottomDielectricPlateMotor(self.auths_file)
+                self.bottom_plate = BottomDielectricPlateMotor(self.auths_file, self.cmd_interface)
                 self.motors.append(self.bottom_plate)
             elif motor == 'top_dielectric_plate':
-                self.top_plate = TopDielectricPlateMotor(self.auths_file)
+                self.top_plate = TopDielectricPlateMotor(self.auths_file, self.cmd_interface)
                 self.motors.append(self.top_plate)
             else:
                 pass
         self.motor_names = [motor.get_name() for motor in self.motors]
+        # motors are fixed after init, so cache name -> index lookups
+        self._idx = {motor.get_name(): i for i, motor in enumerate(self.motors)}
 
     def get_motor_status(self):
         ''' Returns the status of the initialized motors as a list. '''
@@ -132,16 +145,16 @@ class OrpheusMotors:
         cavity_length_tracker = cavity_length_tracker + increment_distance
         new_plate_separation = self.plate_separation(cavity_length_tracker,num_plates)
 
-        if 'curved_mirror' in self.motor_names:
-            cm_ind = self.motor_names.index('curved_mirror')
+        if 'curved_mirror' in self._idx:
+            cm_ind = self._idx['curved_mirror']
             curved_mirror_steps = self.distance_to_steps(increment_distance)
             print(F'Moving curved mirror motor by {curved_mirror_steps} steps')
             self.motors[cm_ind].move_steps(curved_mirror_steps)
             if move_one_motor_at_a_time:
                 self.wait_for_motors()
 
-        if 'bottom_dielectric_plate' in self.motor_names:
-            bdp_ind = self.motor_names.index('bottom_dielectric_plate')
+        if 'bottom_dielectric_plate' in self._idx:
+            bdp_ind = self._idx['bottom_dielectric_plate']
             diff = plate_separation +increment_distance
             move_bottom_plate = diff - new_plate_separation
             bottom_plate_steps = self.distance_to_steps(move_bottom_plate)
@@ -150,8 +163,8 @@ class OrpheusMotors:
             if move_one_motor_at_a_time:
                 self.wait_for_motors()
 
-        if 'top_dielectric_plate' in self.motor_names:
-            tdp_ind = self.motor_names.index('top_dielectric_plate')
+        if 'top_dielectric_plate' in self._idx:
+            tdp_ind = self._idx['top_dielectric_plate']
             move_top_plate = new_plate_separation - plate_separation
             top_plate_steps = self.distance_to_steps(move_top_plate)
             print(F'Moving top plate motor by {top_plate_steps} steps')
@@ -169,12 +182,11 @@ class OrpheusMotors:
         ''' Returns the new plate separation between the dielectrics. '''
         return length/(num_plates+1)
 
-    def distance_to_steps(self,distance, pitch = (1/20), steps_per_rotation = 20000):
+    def distance_to_steps(self,distance):
         ''' Returns the number of steps that a motor needs to
-            turn given a distance.Input distance in inches. '''
-        num_pitch_lengths = distance/pitch #these many complete rotations
-        steps = steps_per_rotation * num_pitch_lengths
-        return int(round(steps))
+            turn given a distance.Input distance in inches.
+            Pitch and steps per rotation are set in __init__. '''
+        return int(round(distance * self._steps_per_inch))
 
     def set_internal_position_to_value(self, value):
         for motor in self.motors:
@@ -20,7 +20,7 @@ def tone_with_vna(frequency, power):
     the_interface.set('na_if_band', 0)
     the_interface.set('na_power', power)
 
-data_logger = DataLogger(auths_file)
+data_logger = DataLogger(auths_file, interface = the_interface)
 
 sampling_rate = 125e6
 fft_size = 50e3
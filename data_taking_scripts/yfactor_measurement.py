@@ -15,7 +15,7 @@ auths_file = '/etc/rabbitmq-secret/authentications.json'
 
 the_interface = Interface(dripline_config={'auth-file': auths_file})
 
-data_logger = DataLogger(auths_file)
+data_logger = DataLogger(auths_file, interface = the_interface)
 
 sampling_rate = 125e9
 fft_size = 50e3
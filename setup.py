@@ -7,5 +7,10 @@ setup(
     name="dripline-orpheus",
     version='v1.0.0',
     packages=packages,
-    include_package_data=True
+    include_package_data=True,
+    install_requires=[
+        'numpy',
+        'scipy',
+        'numba',
+    ]
 )